@@ -189,7 +189,7 @@ class YoutubeHandler:
 
     @staticmethod
     def compute_format(playlist, fmt):
-        return fmt.format(**playlist.__dict__(), **{"period": "{period}"})
+        return fmt.format(**playlist.to_dict(), **{"period": "{period}"})
 
     def fetch_metadata(self):
         """retrieves and loads metadata from --metadata-from"""
@@ -17,7 +17,6 @@ import re
 import shutil
 import subprocess
 import tempfile
-import multiprocessing
 from gettext import gettext as _
 from pathlib import Path
 
@@ -59,6 +58,7 @@ from youtube2zim.youtube import (
     credentials_ok,
     extract_playlists_details_from,
     get_channel_json,
+    get_channels_json,
     get_videos_authors_info,
     get_videos_json,
     save_channel_branding,
@@ -759,8 +759,15 @@ class Youtube2Zim:
         uniq_channel_ids = list(
             {chan["channelId"] for chan in videos_channels_json.values()}
         )
+        # retrieve all channels at once using batched requests
+        channels_json = get_channels_json(uniq_channel_ids)
         for channel_id in uniq_channel_ids:
-            save_channel_branding(self.channels_dir, channel_id, save_banner=False)
+            save_channel_branding(
+                self.channels_dir,
+                channel_id,
+                save_banner=False,
+                channel_json=channels_json[channel_id],
+            )
             self.copy_default_banner(channel_id)
 
     def copy_default_banner(self, channel_id):
@@ -1024,14 +1031,3 @@ class Youtube2Zim:
 
         # clean videos left out in videos directory
         remove_unused_videos(videos)
-        
-        def generate_subs(video):
-            pass
-        
-        def generate_all_subs(videos):
-            with multiprocessing.Pool() as pool:
-            pool.map(generate_subs, videos)
-        
-        
-            
-        
@@ -1,16 +1,18 @@
 #!/usr/bin/env python3
 # vim: ai ts=4 sts=4 et sw=4 nu
 
-import json
+import functools
 from pathlib import Path
 import multiprocessing
 import youtube_dl
 import re
 
 import jinja2
+import orjson
 from slugify import slugify
 
 
+@functools.lru_cache(maxsize=4096)
 def get_slug(text, *, js_safe=True):
     """slug from text to build URL parts"""
     if js_safe:
@@ -25,8 +27,8 @@ def clean_text(text):
 
 def save_json(cache_dir: Path, key, data):
     """save JSON collection to path"""
-    with open(cache_dir.joinpath(f"{key}.json"), "w") as fp:
-        json.dump(data, fp, indent=4)
+    with open(cache_dir.joinpath(f"{key}.json"), "wb") as fp:
+        fp.write(orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS))
 
 
 def load_json(cache_dir: Path, key):
@@ -35,14 +37,14 @@ def load_json(cache_dir: Path, key):
     if not fname.exists():
         return None
     try:
-        return json.loads(fname.read_bytes())
+        return orjson.loads(fname.read_bytes())
     except Exception:
         return None
 
 
 def load_mandatory_json(cache_dir: Path, key):
     """load mandatory JSON collection from path"""
-    return json.loads(cache_dir.joinpath(f"{key}.json").read_bytes())
+    return orjson.loads(cache_dir.joinpath(f"{key}.json").read_bytes())
 
 
 def has_argument(arg_name, all_args):
@@ -1,11 +1,16 @@
 #!/usr/bin/env python3
 # vim: ai ts=4 sts=4 et sw=4 nu
 
+import concurrent.futures
+import datetime
+import functools
+import io
+import time
+from dataclasses import dataclass, field
 from http import HTTPStatus
 
-import requests
-import multiprocessing
-from dateutil import parser as dt_parser
+import httpx
+import orjson
 from zimscraperlib.download import stream_file
 from zimscraperlib.image.transformation import resize_image
 
@@ -20,23 +25,70 @@ CHANNELS_API = f"{YOUTUBE_API}/channels"
 SEARCH_API = f"{YOUTUBE_API}/search"
 VIDEOS_API = f"{YOUTUBE_API}/videos"
 MAX_VIDEOS_PER_REQUEST = 50  # for VIDEOS_API
+MAX_ITEMS_PER_REQUEST = 50  # for id-list lookups on CHANNELS_API, PLAYLIST_API
 RESULTS_PER_PAGE = 50  # max: 50
 REQUEST_TIMEOUT = 60
-
-
+MAX_CONCURRENT_REQUESTS = 8  # parallel API requests for independent batches
+
+MAX_RETRIES = 5  # for transient API errors
+RETRY_BACKOFF_FACTOR = 0.3  # seconds, doubled on each retry
+RETRY_STATUSES = (
+    HTTPStatus.TOO_MANY_REQUESTS,
+    HTTPStatus.INTERNAL_SERVER_ERROR,
+    HTTPStatus.BAD_GATEWAY,
+    HTTPStatus.SERVICE_UNAVAILABLE,
+    HTTPStatus.GATEWAY_TIMEOUT,
+)
+
+
+class RetryTransport(httpx.HTTPTransport):
+    """HTTP transport retrying requests on transient error statuses
+
+    Last response is returned so callers log and raise_for_status() as usual"""
+
+    def handle_request(self, request):
+        for attempt in range(MAX_RETRIES):
+            response = super().handle_request(request)
+            if response.status_code not in RETRY_STATUSES:
+                return response
+            response.close()
+            time.sleep(RETRY_BACKOFF_FACTOR * (2**attempt))
+        return super().handle_request(request)
+
+
+# shared HTTP/2 client so that API calls are multiplexed over pooled connections
+_CLIENT = httpx.Client(
+    timeout=REQUEST_TIMEOUT,
+    headers={"Accept-Encoding": "gzip", "Accept": "application/json"},
+    transport=RetryTransport(
+        http2=True,
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        retries=MAX_RETRIES,
+    ),
+)
+
+
+@dataclass(slots=True)
 class Playlist:
-    def __init__(self, playlist_id, title, description, creator_id, creator_name):
-        self.playlist_id = playlist_id
-        self.title = title
-        self.description = description
-        self.creator_id = creator_id
-        self.creator_name = creator_name
-        self.slug = get_slug(title, js_safe=True)
+    playlist_id: str
+    title: str
+    description: str
+    creator_id: str
+    creator_name: str
+    slug: str = field(init=False)
+    slug_dashed: str = field(init=False)
+
+    def __post_init__(self):
+        self.slug = get_slug(self.title, js_safe=True)
+        self.slug_dashed = self.slug.replace("_", "-")
 
     @classmethod
     def from_id(cls, playlist_id):
-        playlist_json = get_playlist_json(playlist_id)
-        return Playlist(
+        return cls.from_json(playlist_id, get_playlist_json(playlist_id))
+
+    @classmethod
+    def from_json(cls, playlist_id, playlist_json):
+        return cls(
             playlist_id=playlist_id,
             title=playlist_json["snippet"]["title"],
             description=playlist_json["snippet"]["description"],
@@ -44,53 +96,89 @@ class Playlist:
             creator_name=playlist_json["snippet"]["channelTitle"],
         )
 
-    def __dict__(self):
+    def to_dict(self):
         return {
             "playlist_id": self.playlist_id,
             "title": self.title,
             "description": self.description,
             "creator_id": self.creator_id,
             "creator_name": self.creator_name,
-            "slug": self.slug.replace("_", "-"),
+            "slug": self.slug_dashed,
         }
 
 
 def credentials_ok():
     """Check that a YouTube search is successful, validating API_KEY."""
-    req = requests.get(
+    req = _CLIENT.get(
         SEARCH_API,
         params={"part": "snippet", "maxResults": 1, "key": YOUTUBE.api_key},
-        timeout=REQUEST_TIMEOUT,
     )
     if req.status_code >= HTTPStatus.BAD_REQUEST:
         logger.error(f"HTTP {req.status_code} Error response: {req.text}")
     try:
         req.raise_for_status()
-        return bool(req.json()["items"])
+        return bool(orjson.loads(req.content)["items"])
     except Exception:
         return False
 
 
+def _get_items_json(api, cache_prefix, ids, part):
+    """Fetch or retrieve-save and return JSON of `ids` resources, by id.
+
+    Resources are cached as `{cache_prefix}_{id}`; those not in cache are queried
+    in batches of MAX_ITEMS_PER_REQUEST. Raises KeyError if any is not found."""
+    items = {}
+    missing_ids = []
+    for item_id in ids:
+        item_json = load_json(YOUTUBE.cache_dir, f"{cache_prefix}_{item_id}")
+        if item_json is None:
+            missing_ids.append(item_id)
+        else:
+            items[item_id] = item_json
+
+    for interv in range(0, len(missing_ids), MAX_ITEMS_PER_REQUEST):
+        batch_ids = missing_ids[interv : interv + MAX_ITEMS_PER_REQUEST]
+        logger.debug(f"Query YouTube API for {len(batch_ids)} {cache_prefix}s")
+        req = _CLIENT.get(
+            api,
+            params={"id": ",".join(batch_ids), "part": part, "key": YOUTUBE.api_key},
+        )
+        if req.status_code >= HTTPStatus.BAD_REQUEST:
+            logger.error(f"HTTP {req.status_code} Error response: {req.text}")
+        req.raise_for_status()
+        for item_json in orjson.loads(req.content).get("items", []):
+            save_json(YOUTUBE.cache_dir, f"{cache_prefix}_{item_json['id']}", item_json)
+            items[item_json["id"]] = item_json
+
+    for item_id in ids:
+        if item_id not in items:
+            logger.error(f"Invalid {cache_prefix}Id `{item_id}`: Not Found")
+            raise KeyError(item_id)
+
+    return items
+
+
+# memoized: returned JSON is shared between callers, do not mutate it
+@functools.lru_cache(maxsize=1024)
 def get_channel_json(channel_id, *, for_username=False):
     """Fetch or retrieve-save and return the YouTube ChannelResult JSON."""
     fname = f"channel_{channel_id}"
     channel_json = load_json(YOUTUBE.cache_dir, fname)
     if channel_json is None:
         logger.debug(f"Query YouTube API for Channel #{channel_id}")
-        req = requests.get(
+        req = _CLIENT.get(
             CHANNELS_API,
             params={
                 "forUsername" if for_username else "id": channel_id,
                 "part": "brandingSettings,snippet,contentDetails",
                 "key": YOUTUBE.api_key,
             },
-            timeout=REQUEST_TIMEOUT,
         )
         if req.status_code >= HTTPStatus.BAD_REQUEST:
             logger.error(f"HTTP {req.status_code} Error response: {req.text}")
         req.raise_for_status()
         try:
-            channel_json = req.json()["items"][0]
+            channel_json = orjson.loads(req.content)["items"][0]
         except (KeyError, IndexError):
             if for_username:
                 logger.error(f"Invalid username `{channel_id}`: Not Found")
@@ -101,6 +189,15 @@ def get_channel_json(channel_id, *, for_username=False):
     return channel_json
 
 
+def get_channels_json(channel_ids):
+    """Fetch or retrieve-save and return YouTube ChannelResult JSONs by channelId."""
+    return _get_items_json(
+        CHANNELS_API, "channel", channel_ids, "brandingSettings,snippet,contentDetails"
+    )
+
+
+# memoized: returned JSON is shared between callers, do not mutate it
+@functools.lru_cache(maxsize=1024)
 def get_channel_playlists_json(channel_id):
     """Fetch or retrieve-save and return the YouTube Playlists JSON for a channel."""
     fname = f"channel_{channel_id}_playlists"
@@ -112,47 +209,46 @@ def get_channel_playlists_json(channel_id):
     logger.debug(f"Query YouTube API for Playlists of channel #{channel_id}")
 
     items = []
-    page_token = None
+    params = {
+        "channelId": channel_id,
+        "part": "id",
+        "fields": "items/id,nextPageToken",
+        "key": YOUTUBE.api_key,
+        "maxResults": RESULTS_PER_PAGE,
+    }
     while True:
-        req = requests.get(
-            PLAYLIST_API,
-            params={
-                "channelId": channel_id,
-                "part": "id",
-                "key": YOUTUBE.api_key,
-                "maxResults": RESULTS_PER_PAGE,
-                "pageToken": page_token,
-            },
-            timeout=REQUEST_TIMEOUT,
-        )
+        req = _CLIENT.get(PLAYLIST_API, params=params)
         if req.status_code >= HTTPStatus.BAD_REQUEST:
             logger.error(f"HTTP {req.status_code} Error response: {req.text}")
         req.raise_for_status()
-        channel_playlists_json = req.json()
+        channel_playlists_json = orjson.loads(req.content)
         items += channel_playlists_json["items"]
-        save_json(YOUTUBE.cache_dir, fname, items)
         page_token = channel_playlists_json.get("nextPageToken")
         if not page_token:
             break
+        params["pageToken"] = page_token
+
+    save_json(YOUTUBE.cache_dir, fname, items)
     return items
 
 
+# memoized: returned JSON is shared between callers, do not mutate it
+@functools.lru_cache(maxsize=1024)
 def get_playlist_json(playlist_id):
     """Fetch or retrieve-save and return the YouTube PlaylistResult JSON."""
     fname = f"playlist_{playlist_id}"
     playlist_json = load_json(YOUTUBE.cache_dir, fname)
     if playlist_json is None:
         logger.debug(f"Query YouTube API for Playlist #{playlist_id}")
-        req = requests.get(
+        req = _CLIENT.get(
             PLAYLIST_API,
             params={"id": playlist_id, "part": "snippet", "key": YOUTUBE.api_key},
-            timeout=REQUEST_TIMEOUT,
         )
         if req.status_code >= HTTPStatus.BAD_REQUEST:
             logger.error(f"HTTP {req.status_code} Error response: {req.text}")
         req.raise_for_status()
         try:
-            playlist_json = req.json()["items"][0]
+            playlist_json = orjson.loads(req.content)["items"][0]
         except IndexError:
             logger.error(f"Invalid playlistId `{playlist_id}`: Not Found")
             raise
@@ -160,6 +256,13 @@ def get_playlist_json(playlist_id):
     return playlist_json
 
 
+def get_playlists_json(playlist_ids):
+    """Fetch or retrieve-save and return YouTube PlaylistResult JSONs by playlistId."""
+    return _get_items_json(PLAYLIST_API, "playlist", playlist_ids, "snippet")
+
+
+# memoized: returned JSON is shared between callers, do not mutate it
+@functools.lru_cache(maxsize=1024)
 def get_videos_json(playlist_id):
     """Retrieve a list of YouTube PlaylistItem dicts with necessary details."""
 
@@ -171,27 +274,28 @@ def get_videos_json(playlist_id):
     logger.debug(f"Querying YouTube API for PlaylistItems of playlist #{playlist_id}")
 
     items = []
-    page_token = None
+    params = {
+        "playlistId": playlist_id,
+        "part": "snippet,contentDetails",
+        # only what's used by filters and scraper
+        "fields": "items("
+        "snippet(title,description,publishedAt,channelId,position),"
+        "contentDetails(videoId,videoPublishedAt)"
+        "),nextPageToken",
+        "key": YOUTUBE.api_key,
+        "maxResults": RESULTS_PER_PAGE,
+    }
     while True:
-        req = requests.get(
-            PLAYLIST_ITEMS_API,
-            params={
-                "playlistId": playlist_id,
-                "part": "snippet,contentDetails",
-                "key": YOUTUBE.api_key,
-                "maxResults": RESULTS_PER_PAGE,
-                "pageToken": page_token,
-            },
-            timeout=REQUEST_TIMEOUT,
-        )
+        req = _CLIENT.get(PLAYLIST_ITEMS_API, params=params)
         if req.status_code >= HTTPStatus.BAD_REQUEST:
             logger.error(f"HTTP {req.status_code} Error response: {req.text}")
         req.raise_for_status()
-        videos_json = req.json()
+        videos_json = orjson.loads(req.content)
         items += videos_json["items"]
         page_token = videos_json.get("nextPageToken")
         if not page_token:
             break
+        params["pageToken"] = page_token
 
     save_json(YOUTUBE.cache_dir, fname, items)
     return items
@@ -207,64 +311,75 @@ def get_videos_authors_info(videos_ids):
 
     logger.debug(f"Querying YouTube API for Video details of {len(videos_ids)} videos")
 
-    items = {}
-
     def retrieve_videos_for(videos_ids):
         """{videoId: {channelId: channelTitle}} for all videos_ids."""
         req_items = {}
-        page_token = None
+        params = {
+            "id": ",".join(videos_ids),
+            "part": "snippet",
+            "fields": "items(id,snippet(channelId,channelTitle)),nextPageToken",
+            "key": YOUTUBE.api_key,
+            "maxResults": RESULTS_PER_PAGE,
+        }
         while True:
-            req = requests.get(
-                VIDEOS_API,
-                params={
-                    "id": ",".join(videos_ids),
-                    "part": "snippet",
-                    "key": YOUTUBE.api_key,
-                    "maxResults": RESULTS_PER_PAGE,
-                    "pageToken": page_token,
-                },
-                timeout=REQUEST_TIMEOUT,
-            )
+            req = _CLIENT.get(VIDEOS_API, params=params)
             if req.status_code >= HTTPStatus.BAD_REQUEST:
                 logger.error(f"HTTP {req.status_code} Error response: {req.text}")
             req.raise_for_status()
-            videos_json = req.json()
+            videos_json = orjson.loads(req.content)
             for item in videos_json["items"]:
-                req_items.update(
-                    {
-                        item["id"]: {
-                            "channelId": item["snippet"]["channelId"],
-                            "channelTitle": item["snippet"]["channelTitle"],
-                        }
-                    }
-                )
+                req_items[item["id"]] = {
+                    "channelId": item["snippet"]["channelId"],
+                    "channelTitle": item["snippet"]["channelTitle"],
+                }
             page_token = videos_json.get("nextPageToken")
             if not page_token:
                 break
+            params["pageToken"] = page_token
         return req_items
 
     # Split it over n requests so that each request includes
-    # at most MAX_VIDEOS_PER_REQUEST videoId to avoid URI size issues
-    for interv in range(0, len(videos_ids), MAX_VIDEOS_PER_REQUEST):
-        items.update(
-            retrieve_videos_for(videos_ids[interv : interv + MAX_VIDEOS_PER_REQUEST])
-        )
+    # at most MAX_VIDEOS_PER_REQUEST videoId to avoid URI size issues.
+    # Batches are independent so we fetch them concurrently.
+    batches = [
+        videos_ids[interv : interv + MAX_VIDEOS_PER_REQUEST]
+        for interv in range(0, len(videos_ids), MAX_VIDEOS_PER_REQUEST)
+    ]
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=MAX_CONCURRENT_REQUESTS
+    ) as executor:
+        futures = [executor.submit(retrieve_videos_for, batch) for batch in batches]
+        # merged in submission order to keep a stable cache file
+        items = {
+            video_id: author
+            for future in futures
+            for video_id, author in future.result().items()
+        }
 
     save_json(YOUTUBE.cache_dir, "videos_channels", items)
 
     return items
 
 
-def save_channel_branding(channels_dir, channel_id, *, save_banner=False):
-    """Download, save, and resize profile [and banner] of a channel."""
-    channel_json = get_channel_json(channel_id)
+def save_channel_branding(
+    channels_dir, channel_id, *, save_banner=False, channel_json=None
+):
+    """Download, save, and resize profile [and banner] of a channel.
+
+    channel_json is retrieved via get_channel_json() if not provided."""
+    if channel_json is None:
+        channel_json = get_channel_json(channel_id)
 
     thumbnails = channel_json["snippet"]["thumbnails"]
-    thumbnail = None
-    for quality in ("medium", "default"):  # high:800px, medium:240px, default:88px
-        if quality in thumbnails.keys():
-            thumbnail = thumbnails[quality]["url"]
-            break
+    # high:800px, medium:240px, default:88px
+    thumbnail = next(
+        (
+            thumbnails[quality]["url"]
+            for quality in ("medium", "default")
+            if quality in thumbnails
+        ),
+        None,
+    )
 
     channel_dir = channels_dir.joinpath(channel_id)
     channel_dir.mkdir(exist_ok=True)
@@ -273,9 +388,11 @@ def save_channel_branding(channels_dir, channel_id, *, save_banner=False):
     if not profile_path.exists():
         if not thumbnail:
             raise Exception("Thumbnail not found")
-        stream_file(thumbnail, profile_path)
-        # Resize profile as we only use up 100px/80 sq
-        resize_image(profile_path, width=100, height=100)
+        # Download in memory and only write resized profile
+        # as we only use up 100px/80 sq
+        thumbnail_bytes = io.BytesIO()
+        stream_file(thumbnail, byte_stream=thumbnail_bytes)
+        resize_image(thumbnail_bytes, width=100, height=100, dst=profile_path)
 
     # Currently disabled as per deprecation of the following property
     # without an alternative way to retrieve it (using the API)
@@ -297,7 +414,10 @@ def skip_deleted_videos(item):
 
 def skip_outofrange_videos(date_range, item):
     """Filter func to filter-out videos that are not within specified date range."""
-    return dt_parser.parse(item["snippet"]["publishedAt"]).date() in date_range
+    # publishedAt is ISO 8601 UTC (`2021-05-04T12:34:56Z`), date part is enough
+    return (
+        datetime.date.fromisoformat(item["snippet"]["publishedAt"][:10]) in date_range
+    )
 
 
 def extract_playlists_details_from(collection_type, youtube_id):
@@ -326,21 +446,18 @@ def extract_playlists_details_from(collection_type, youtube_id):
     else:
         raise NotImplementedError("Unsupported collection_type")
 
+    playlist_ids = list(dict.fromkeys(playlist_ids))  # dedup, keeping order
+    playlists_json = get_playlists_json(playlist_ids)
     return (
-        [Playlist.from_id(playlist_id) for playlist_id in list(set(playlist_ids))],
+        [
+            Playlist.from_json(playlist_id, playlists_json[playlist_id])
+            for playlist_id in playlist_ids
+        ],
         main_channel_id,
         uploads_playlist_id,
     )
 
 
-def generate_subs(video):
-    # code here to be added for the subtitles 
-    pass 
-
-def generate_all_subs(videos):
-    with multiprocessing.Pool() as pool: 
-        pool.map(generate_subs, videos)
-
 def main():
     
     pass